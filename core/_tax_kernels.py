@@ -0,0 +1,182 @@
+# core/_tax_kernels.py
+# Kernels escalares do cálculo fiscal (INSS, IRRF, CLT e PJ).
+#
+# Recebem e devolvem apenas floats/tuplas, sem dicts, para compilarem em modo
+# nopython quando o Numba estiver instalado. As tabelas fiscais entram como
+# argumento e não como globais: com cache=True o Numba trata globais como
+# constantes e não invalida o cache em disco se a tabela do ano mudar.
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # Numba é opcional: sem ele os kernels rodam como Python puro
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Códigos de cenário devolvidos por pj_net (e por views._pj_batch)
+PJ_SCENARIO_MEI, PJ_SCENARIO_ANEXO_V, PJ_SCENARIO_ANEXO_III, PJ_SCENARIO_MANUAL = range(4)
+
+
+@njit(cache=True)
+def inss(gross_salary, brackets, ceiling):
+    """
+    INSS progressivo. brackets = ((teto, piso, alíquota, imposto acumulado), ...);
+    acima do último teto vale o desconto máximo (ceiling).
+    """
+    # Faixas anteriores já vêm somadas em prior_tax; só a fatia da faixa atual é calculada
+    for ceil, floor, rate, prior_tax in brackets:
+        if gross_salary <= ceil:
+            return prior_tax + (gross_salary - floor) * rate
+    return ceiling
+
+
+@njit(cache=True)
+def irrf(base_salary, table, simplified_deduction):
+    """
+    IRRF sobre a base (Bruto - INSS), já aplicando o desconto simplificado.
+    table = ((limite, alíquota, parcela a deduzir), ...); a primeira faixa é a isenta.
+    """
+    taxable_base = base_salary - simplified_deduction
+
+    if taxable_base <= table[0][0]: # Limite de isenção pós-desconto
+        return 0.0
+
+    # Primeira faixa com taxable_base <= limite (a última é infinita).
+    # Varredura e não bisect: bisect não compila em nopython, e np.searchsorted
+    # num escalar custa mais que as 5 faixas sem Numba. A busca por limites
+    # ordenados fica no caminho vetorizado (views._irrf_batch).
+    for limit, rate, deduction in table:
+        if taxable_base <= limit:
+            tax = (taxable_base * rate) - deduction
+            return max(0.0, tax) # Imposto não pode ser negativo
+    return 0.0 # Fallback
+
+
+@njit(cache=True)
+def clt_equivalent(gross_salary, extra_benefits, inss_brackets, inss_ceiling, irrf_table, irrf_deduction):
+    """
+    Valor equivalente do CLT. Retorna (INSS, IRRF, líquido, 13º, férias, FGTS,
+    valor equivalente).
+    """
+    # 1. Calcular Descontos do Salário Mensal
+    inss_discount = inss(gross_salary, inss_brackets, inss_ceiling)
+    base_for_irrf = gross_salary - inss_discount
+    irrf_discount = irrf(base_for_irrf, irrf_table, irrf_deduction)
+
+    net_salary = gross_salary - inss_discount - irrf_discount
+
+    # 2. Calcular Benefícios Mensalizados
+    # FGTS é sempre sobre o bruto e não tem desconto
+    fgts_monthly = gross_salary * 0.08
+
+    # 13º (Líquido)
+    # Nota: O cálculo real do 13º tem descontos próprios, mas usar o
+    # salário líquido como base é uma aproximação 99% correta.
+    net_thirteenth_monthly = net_salary / 12
+
+    # Férias + 1/3 (Líquido)
+    gross_vacation = gross_salary * (1 + 1/3)
+    # INSS e IRRF também incidem sobre as férias
+    inss_vacation = inss(gross_vacation, inss_brackets, inss_ceiling)
+    irrf_vacation = irrf(gross_vacation - inss_vacation, irrf_table, irrf_deduction)
+    net_vacation = gross_vacation - inss_vacation - irrf_vacation
+    net_vacation_monthly = net_vacation / 12
+
+    # 3. Valor Total Equivalente (Dinheiro no bolso + Patrimônio)
+    equivalent_value = net_salary + net_thirteenth_monthly + net_vacation_monthly + fgts_monthly + extra_benefits
+
+    return (inss_discount, irrf_discount, net_salary, net_thirteenth_monthly,
+            net_vacation_monthly, fgts_monthly, equivalent_value)
+
+
+@njit(cache=True)
+def pj_net(gross_revenue, costs, has_override, tax_rate_override, pj_params, irrf_table, irrf_deduction):
+    """
+    Valor líquido PJ com a escolha pelo Fator R.
+    pj_params = (limite MEI, DAS MEI, INSS do pró-labore mínimo, alíquota Anexo III,
+    alíquota Anexo V).
+    Retorna (cenário PJ_SCENARIO_*, alíquota, DAS, INSS do pró-labore,
+    IRRF do pró-labore, líquido antes das provisões, 13º, férias,
+    total de provisões, líquido final).
+    """
+    mei_limit, das_mei, inss_min_pro_labore, anexo_iii_rate, anexo_v_rate = pj_params
+
+    # 1. Cenário MEI (Simples e direto)
+    if gross_revenue <= mei_limit:
+        scenario = PJ_SCENARIO_MEI
+        tax_rate = 0.0
+        tax_amount_das = das_mei
+        inss_pro_labore = 0.0
+        irrf_pro_labore = 0.0
+        total_costs = costs + tax_amount_das
+        net_value_pre_provision = gross_revenue - total_costs
+
+    # 2. Cenário Simples Nacional (A Mágica do Fator R)
+    else:
+        # Se usuário forçou a taxa, usamos a lógica antiga (sem otimização)
+        if has_override:
+            scenario = PJ_SCENARIO_MANUAL
+            tax_rate = tax_rate_override
+            tax_amount_das = gross_revenue * tax_rate
+            # Assume pró-labore mínimo para quem força a taxa
+            inss_pro_labore = inss_min_pro_labore
+            irrf_pro_labore = 0.0 # IRRF é isento no salário mínimo
+
+        else:
+            # --- Otimização: Calcular os DOIS cenários ---
+
+            # Cenário A: ANEXO V (Pró-labore Mínimo)
+            # O pró-labore é sempre o mínimo: INSS constante e IRRF isento
+            inss_A = inss_min_pro_labore
+            irrf_A = 0.0
+            das_A = gross_revenue * anexo_v_rate
+            total_cost_A = das_A + inss_A + irrf_A
+            net_A = gross_revenue - costs - total_cost_A
+
+            # Cenário B: ANEXO III (Fator R >= 28%)
+            pl_B = gross_revenue * 0.28
+            inss_B = pl_B * 0.11
+            irrf_B_base = pl_B - inss_B
+            irrf_B = irrf(irrf_B_base, irrf_table, irrf_deduction) # IRRF sobre pró-labore alto
+            das_B = gross_revenue * anexo_iii_rate
+            total_cost_B = das_B + inss_B + irrf_B
+            net_B = gross_revenue - costs - total_cost_B
+
+            # --- Decisão do "Contador Digital" ---
+            if net_B > net_A:
+                # Vale a pena pagar mais INSS/IRRF para economizar no DAS
+                scenario = PJ_SCENARIO_ANEXO_III
+                tax_rate = anexo_iii_rate
+                tax_amount_das = das_B
+                inss_pro_labore = inss_B
+                irrf_pro_labore = irrf_B
+            else:
+                # Mais barato ficar no Anexo V
+                scenario = PJ_SCENARIO_ANEXO_V
+                tax_rate = anexo_v_rate
+                tax_amount_das = das_A
+                inss_pro_labore = inss_A
+                irrf_pro_labore = irrf_A
+
+        total_costs = costs + tax_amount_das + inss_pro_labore + irrf_pro_labore
+        net_value_pre_provision = gross_revenue - total_costs
+
+    # 3. Calcular Provisões (Férias/13º)
+    # A provisão é sobre o LÍQUIDO que sobra, não sobre o bruto.
+    # Um duodécimo para cada provisão, calculado uma vez. Trocar a divisão por
+    # net * (1/12) ou o final por net * 5/6 foi descartado: muda o último bit e
+    # o arredondamento de valores que caem em meio centavo.
+    thirteenth_provision = net_value_pre_provision / 12
+    vacation_provision = thirteenth_provision # Simplificado (1 mês)
+    total_provisions = thirteenth_provision + vacation_provision
+
+    net_value_with_provisioning = net_value_pre_provision - total_provisions
+
+    return (scenario, tax_rate, tax_amount_das, inss_pro_labore, irrf_pro_labore,
+            net_value_pre_provision, thirteenth_provision, vacation_provision,
+            total_provisions, net_value_with_provisioning)
@@ -0,0 +1,96 @@
+# core/data.py
+# Base de salários de mercado (salarios_mercado.csv), carregada sob demanda.
+
+import csv
+import logging
+import os
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'salarios_mercado.csv')
+
+# Médias de mercado de um cargo (imutável: o mesmo objeto serve todas as requisições)
+MarketRate = namedtuple('MarketRate', ['clt', 'pj'])
+
+# Série histórica de um cargo em colunas (SoA), em ordem cronológica:
+# dates é um array datetime64[M] (mês de referência), labels os rótulos do
+# gráfico ('%b/%y') já formatados e clt e pj são arrays float32, todos do mesmo tamanho.
+# float32 basta para a série (só alimenta o gráfico e a tendência) e representa
+# exatamente os valores da base, que são reais inteiros. Os cálculos fiscais
+# usam o MarketRate do index, que continua em float64.
+MarketSeries = namedtuple('MarketSeries', ['dates', 'labels', 'clt', 'pj'])
+
+# index:   (area, seniority, location) -> MarketRate do mês mais recente
+# history: (area, seniority, location) -> MarketSeries
+# areas / seniorities / locations: tuplas para os dropdowns
+MarketData = namedtuple('MarketData', ['index', 'history', 'areas', 'seniorities', 'locations'])
+
+# ===================================================================
+# CARREGAR A BASE DE DADOS
+# ===================================================================
+
+@lru_cache(maxsize=None)
+def load_market():
+    """
+    Lê o CSV na primeira chamada e guarda o resultado no processo.
+    Assim comandos como makemigrations/collectstatic não pagam a leitura;
+    só a primeira requisição que precisa dos dados.
+    """
+    if not os.path.exists(CSV_PATH):
+        # Sem a base, o app sobe com os dropdowns vazios (o formulário não valida)
+        logger.error("'salarios_mercado.csv' não encontrado em %s", CSV_PATH)
+        return MarketData({}, {}, (), (), ())
+
+    # A base só é consultada por igualdade de (area, seniority, location),
+    # então lemos com csv.reader e agrupamos em dicionários (sem Pandas).
+    with open(CSV_PATH, newline='', encoding='utf-8') as fh:
+        reader = csv.reader(fh)
+        header = next(reader)
+        columns = [header.index(name) for name in
+                   ('data_ref', 'area', 'seniority', 'location', 'clt_avg', 'pj_avg')]
+        rows = [tuple(row[i] for i in columns) for row in reader]
+    # Datas em ISO (AAAA-MM-DD): a ordem das strings já é a cronológica
+    rows.sort(key=lambda r: r[0])
+
+    # Uma única passada pelas linhas agrupa por cargo e monta as listas dos dropdowns
+    groups = {}
+    areas = set()
+    locations = set()
+    for data_ref, area, seniority, location, clt_avg, pj_avg in rows:
+        groups.setdefault((area, seniority, location), []).append((data_ref, clt_avg, pj_avg))
+        areas.add(area)
+        locations.add(location)
+
+    # Cada grupo vira colunas NumPy: a consulta da série é só um fatiamento.
+    # Os valores são convertidos de texto para float64 uma vez, aqui; a média do
+    # último mês (as linhas vão ordenadas por data) sai com .item() como float
+    # nativo, então a requisição não faz nenhuma conversão.
+    index = {}
+    history = {}
+    for key, records in groups.items():
+        dates, clt_values, pj_values = zip(*records)
+        clt_values = np.array(clt_values, dtype=np.float64)
+        pj_values = np.array(pj_values, dtype=np.float64)
+        index[key] = MarketRate(clt_values[-1].item(), pj_values[-1].item())
+
+        months = np.array(dates, dtype='datetime64[D]').astype('datetime64[M]')
+        history[key] = MarketSeries(
+            months,
+            tuple(month.strftime('%b/%y') for month in months.astype(date)),
+            clt_values.astype(np.float32),
+            pj_values.astype(np.float32),
+        )
+
+    # Tuplas imutáveis: o template só itera sobre elas
+    return MarketData(
+        index,
+        history,
+        tuple(sorted(areas)),
+        ('Júnior', 'Pleno', 'Sênior'),
+        tuple(sorted(locations)),
+    )
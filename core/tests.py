@@ -1,3 +1,153 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from . import views
+from . import _tax_kernels
+from .data import load_market
+
+# Valores nas bordas das faixas: o limite exato, 1 centavo abaixo e 1 acima
+def _edges(limits):
+    return [round(limit + delta, 2) for limit in limits for delta in (-0.01, 0.0, 0.01)]
+
+_INSS_EDGES = _edges(limit for limit, _ in views.INSS_TABLE)
+# As faixas do IRRF incidem sobre (base - desconto simplificado)
+_IRRF_BASE_EDGES = _edges(limit + views.IRRF_SIMPLIFIED_DEDUCTION for limit, _, _ in views.IRRF_TABLE[:-1])
+_MEI_EDGES = _edges([views.MEI_MONTHLY_REVENUE_LIMIT])
+_SAMPLES = [1.0, 1000.0, 3500.50, 5234.57, 9999.99, 15000.0, 28432.11, 60000.0]
+
+_CLT_KEYS = ('grossSalary', 'extraBenefits', 'inssDiscount', 'irrfDiscount', 'netSalary',
+             'thirteenthMonthly', 'vacationMonthly', 'fgtsMonthly', 'equivalentValue')
+_PJ_KEYS = ('taxRate', 'taxAmount', 'proLaboreInss', 'proLaboreIrrf', 'netValue',
+            'thirteenthProvision', 'vacationProvision', 'totalProvisions', 'netValueWithProvisioning')
+
+
+class BatchMatchesScalarTests(SimpleTestCase):
+    """
+    As versões vetorizadas (_*_batch) devem dar exatamente os mesmos valores
+    que o cálculo escalar da view (kernels de _tax_kernels, com ou sem Numba).
+    """
+
+    def test_inss_batch(self):
+        values = _INSS_EDGES + _SAMPLES
+        batch = views._inss_batch(values)
+        for i, gross in enumerate(values):
+            self.assertEqual(batch[i], views.calculate_inss_clt(gross), gross)
+
+    def test_irrf_batch(self):
+        values = _IRRF_BASE_EDGES + _SAMPLES
+        batch = views._irrf_batch(values)
+        for i, base in enumerate(values):
+            self.assertEqual(batch[i], views.calculate_irrf(base), base)
+
+    def test_clt_batch(self):
+        # Bordas do INSS e do IRRF (que cai perto delas quando vista como bruto)
+        values = _INSS_EDGES + _IRRF_BASE_EDGES + _SAMPLES
+        for extra in (0.0, 350.5):
+            batch = views._clt_batch(values, extra)
+            for i, gross in enumerate(values):
+                expected = views.calculate_clt_equivalent_monthly_value(gross, extra)
+                got = {key: column[i] for key, column in zip(_CLT_KEYS, batch)}
+                for key in _CLT_KEYS:
+                    self.assertEqual(got[key], expected[key], (gross, extra, key))
+
+    def test_clt_batch_shapes(self):
+        batch = views._clt_batch([1412.0, 5000.0, 9000.0], 100.0)
+        self.assertEqual({column.shape for column in batch}, {(3,)})
+
+    def test_pj_batch(self):
+        values = _MEI_EDGES + [2 * views.MEI_MONTHLY_REVENUE_LIMIT] + _IRRF_BASE_EDGES + _SAMPLES
+        for override in (None, 0.1):
+            for costs in (0.0, 2817.5):
+                scenario, *columns = views._pj_batch(values, costs, override)
+                for i, gross in enumerate(values):
+                    expected = views.calculate_pj_net_value(gross, costs, override)
+                    regime, strategy = views._PJ_REGIMES[scenario[i]]
+                    self.assertEqual(regime, expected['regime'], gross)
+                    if strategy is not None:
+                        self.assertEqual(strategy, expected['strategy'], gross)
+                    for key, column in zip(_PJ_KEYS, columns):
+                        self.assertEqual(column[i], expected[key], (gross, costs, override, key))
+
+    def test_mei_cutoff(self):
+        below, at, above = _MEI_EDGES
+        scenario = views._pj_batch([below, at, above])[0]
+        self.assertEqual(list(scenario[:2]), [views.PJ_SCENARIO_MEI, views.PJ_SCENARIO_MEI])
+        self.assertNotEqual(scenario[2], views.PJ_SCENARIO_MEI)
+        self.assertEqual(views.calculate_pj_net_value(at)['regime'], 'MEI')
+        self.assertEqual(views.calculate_pj_net_value(above)['regime'], 'Simples Nacional')
+
+
+class ToFloatTests(SimpleTestCase):
+
+    def test_input_and_brazilian_formats(self):
+        self.assertEqual(views._to_float('1234.56'), 1234.56)
+        self.assertEqual(views._to_float('1.234,56'), 1234.56)
+        self.assertEqual(views._to_float('1234,5'), 1234.5)
+
+    def test_dot_without_comma_is_decimal(self):
+        # Sem vírgula o ponto é sempre decimal (é o que o input type="number" envia)
+        self.assertEqual(views._to_float('5.000'), 5.0)
+        self.assertEqual(views._to_float('5.000,00'), 5000.0)
+
+    def test_us_format_fails_validation(self):
+        # "5,000.00" não pode virar R$ 5,00: vira 0.0 e a view recusa o valor
+        self.assertEqual(views._to_float('5,000.00'), 0.0)
+        self.assertEqual(views._to_float('1,234,567.89'), 0.0)
+
+    def test_empty_or_invalid(self):
+        self.assertEqual(views._to_float(''), 0.0)
+        self.assertEqual(views._to_float('abc'), 0.0)
+
+
+class HomeViewTests(SimpleTestCase):
+
+    def _form(self, **overrides):
+        market = load_market()
+        form = {'area': market.areas[0], 'seniority': 'Pleno', 'location': market.locations[0],
+                'clt_bruto': '5000', 'pj_bruto': '9000'}
+        form.update(overrides)
+        return form
+
+    def test_valid_post_renders_result(self):
+        # Com ou sem X-Requested-With, um envio válido devolve a página de resultado
+        for headers in ({}, {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}):
+            response = self.client.post('/', self._form(), **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNotNone(response.context['result'])
+
+    def test_ajax_validation_error_is_json(self):
+        response = self.client.post('/', self._form(clt_bruto='0'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_analysis_error_shows_message(self):
+        with mock.patch.object(views, '_run_analysis', side_effect=ZeroDivisionError):
+            response = self.client.post('/', self._form())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['error'], views._PROCESSING_ERROR)
+
+    def test_validation_error_renders_page(self):
+        response = self.client.post('/', self._form(clt_bruto='0'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['error'])
+
+
+@skipUnless(_tax_kernels.NUMBA_AVAILABLE, 'Numba não instalado')
+class NumbaKernelTests(SimpleTestCase):
+    """Os kernels compilados devem dar o mesmo resultado que o Python puro (py_func)."""
+
+    def test_clt_equivalent(self):
+        kernel = _tax_kernels.clt_equivalent
+        for gross in _INSS_EDGES + _IRRF_BASE_EDGES + _SAMPLES:
+            args = (gross, 0.0, views._INSS_BRACKETS, views.INSS_CEILING,
+                    views.IRRF_TABLE, views.IRRF_SIMPLIFIED_DEDUCTION)
+            self.assertEqual(kernel(*args), kernel.py_func(*args), gross)
+
+    def test_pj_net(self):
+        kernel = _tax_kernels.pj_net
+        for gross in _MEI_EDGES + _IRRF_BASE_EDGES + _SAMPLES:
+            for has_override, override in ((False, 0.0), (True, 0.1)):
+                args = (gross, 100.0, has_override, override, views._PJ_PARAMS,
+                        views.IRRF_TABLE, views.IRRF_SIMPLIFIED_DEDUCTION)
+                self.assertEqual(kernel(*args), kernel.py_func(*args), (gross, override))
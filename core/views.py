@@ -1,32 +1,26 @@
 # core/views.py (VERSÃO CORRIGIDA E FIDEDIGNA)
 
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
 from django.shortcuts import render
-import pandas as pd
-import os
+from .data import load_market
+from ._tax_kernels import (
+    PJ_SCENARIO_MEI, PJ_SCENARIO_ANEXO_V, PJ_SCENARIO_ANEXO_III, PJ_SCENARIO_MANUAL,
+    clt_equivalent, inss, irrf, pj_net,
+)
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
 import json
-import numpy as np 
+import numpy as np
 import math
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+from datetime import date, datetime
 
-# ===================================================================
-# CARREGAR A BASE DE DADOS (Sem mudanças)
-# ===================================================================
 try:
-    CSV_PATH = os.path.join(os.path.dirname(__file__), 'salarios_mercado.csv')
-    # Adicionamos parse_dates para o Pandas ler a coluna de data corretamente
-    df_market = pd.read_csv(CSV_PATH, parse_dates=['data_ref'])
-    
-    # Listas para os dropdowns (mantemos igual)
-    AREAS_LIST = sorted(df_market['area'].unique())
-    SENIORITIES_LIST = ['Júnior', 'Pleno', 'Sênior']
-    LOCATIONS_LIST = sorted(df_market['location'].unique())
-except FileNotFoundError:
-    print("ERRO: 'salarios_mercado.csv' não encontrado.")
-    df_market = pd.DataFrame()
-    AREAS_LIST = []
-    SENIORITIES_LIST = []
-    LOCATIONS_LIST = []
+    import orjson
+except ImportError:
+    # orjson é opcional: sem ele os dados dos gráficos saem pelo json da stdlib
+    orjson = None
 
 # ===================================================================
 # CONSTANTES E TABELAS FISCAIS (NOVAS)
@@ -34,25 +28,42 @@ except FileNotFoundError:
 MEI_MONTHLY_REVENUE_LIMIT = 6750.00
 DAS_MEI_FIXED_VALUE = 72.00 
 MINIMUM_WAGE = 1412.00 # Salário Mínimo 2024
+# INSS do sócio com pró-labore mínimo (11%, sem IRRF): constante no cenário Anexo V
+_INSS_MIN_PRO_LABORE = MINIMUM_WAGE * 0.11
 
 # Tabela Progressiva INSS (2024)
-INSS_TABLE = [
+# Tuplas (e não listas): os kernels de _tax_kernels recebem as tabelas como argumento
+INSS_TABLE = (
     (1412.00, 0.075),
     (2666.68, 0.09),
     (4000.03, 0.12),
     (7786.02, 0.14),
-]
+)
 INSS_CEILING = 908.85  # Teto do desconto do INSS
 
+# Tabela INSS em arrays para o cálculo vetorizado (_inss_batch):
+# teto de cada faixa, alíquota, piso da faixa e imposto acumulado das faixas anteriores
+_INSS_CEILS = np.array([limit for limit, _ in INSS_TABLE])
+_INSS_RATES = np.array([rate for _, rate in INSS_TABLE])
+_INSS_FLOORS = np.concatenate(([0.0], _INSS_CEILS[:-1]))
+_INSS_PRIOR_TAX = np.concatenate(([0.0], np.cumsum((_INSS_CEILS - _INSS_FLOORS) * _INSS_RATES)[:-1]))
+# Os mesmos valores em tuplas (teto, piso, alíquota, imposto acumulado) para o kernel escalar
+_INSS_BRACKETS = tuple(zip(_INSS_CEILS.tolist(), _INSS_FLOORS.tolist(),
+                           _INSS_RATES.tolist(), _INSS_PRIOR_TAX.tolist()))
+
 # Tabela Progressiva IRRF (2024 - Simplificada com desconto 564.80)
 # (Limite da Faixa, Alíquota, Parcela a Deduzir)
-IRRF_TABLE = [
+IRRF_TABLE = (
     (2259.20, 0.00, 0.00),     # Isento
     (2826.65, 0.075, 169.44),
     (3751.05, 0.15, 381.44),
     (4664.68, 0.225, 662.77),
     (float('inf'), 0.275, 896.00),
-]
+)
+# Mesma tabela em arrays para o cálculo vetorizado (_irrf_batch)
+_IRRF_LIMITS = np.array([limit for limit, _, _ in IRRF_TABLE])
+_IRRF_RATES = np.array([rate for _, rate, _ in IRRF_TABLE])
+_IRRF_DEDUCTIONS = np.array([deduction for _, _, deduction in IRRF_TABLE])
 # Desconto simplificado opcional do IRRF (ou por deduções legais)
 # Usaremos o simplificado para este cálculo, que na prática sobe a isenção
 IRRF_SIMPLIFIED_DEDUCTION = 564.80
@@ -67,85 +78,177 @@ ANEXO_V_RATE = 0.155 # 15.5% (Sem Fator R)
 # FUNÇÕES DE CÁLCULO FISCAL (NOVAS)
 # ===================================================================
 
+# Troca "," <-> "." numa única passada (1,234.56 -> 1.234,56)
+_CURRENCY_TRANS = str.maketrans({',': '.', '.': ','})
+
+# Cache por processo (cada worker tem o seu); o lru_cache é thread-safe.
+# A chave é o valor em centavos: floats diferentes que exibem o mesmo texto
+# (ex.: FGTS, 13º repetidos no detalhamento) caem na mesma entrada.
+@lru_cache(maxsize=4096)
+def _format_cents(cents):
+    sign = '-' if cents < 0 else ''
+    reais, centavos = divmod(abs(cents), 100)
+    return f"R$ {sign}{reais:,}.{centavos:02d}".translate(_CURRENCY_TRANS)
+
+# Limite para o caminho em centavos: abaixo de 2**51 o produto value * 100 ainda
+# tem resolução de 1/4 de centavo, e o arredondamento bate com o ",.2f".
+# Acima disso (e para nan/inf) formata direto, como antes.
+_CENTS_SAFE_LIMIT = 2 ** 51 / 100
+
 def format_currency(value):
     try:
-        val_str = f"{value:,.2f}"
-        return f"R$ {val_str.replace(',', 'X').replace('.', ',').replace('X', '.')}"
-    except (ValueError, TypeError):
+        if abs(value) < _CENTS_SAFE_LIMIT:
+            # round(value, 2) arredonda como o format ",.2f"; o segundo round só tira o resíduo do * 100
+            return _format_cents(round(round(value, 2) * 100))
+        return f"R$ {value:,.2f}".translate(_CURRENCY_TRANS)
+    except (ValueError, TypeError, OverflowError):
         return "R$ 0,00"
 
+def _to_json(value):
+    """
+    Serializa os dados dos gráficos (listas ou arrays NumPy) para o template.
+    Com ou sem orjson a saída é a mesma: JSON compacto, sem espaços.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
 def calculate_inss_clt(gross_salary):
     """Calcula o INSS progressivo sobre o salário CLT."""
-    if gross_salary > 7786.02:
-        return INSS_CEILING
-    
-    tax = 0
-    previous_limit = 0
-    for limit, rate in INSS_TABLE:
-        if gross_salary > limit:
-            taxable_slice = limit - previous_limit
-            tax += taxable_slice * rate
-            previous_limit = limit
-        else:
-            taxable_slice = gross_salary - previous_limit
-            tax += taxable_slice * rate
-            break
-    return tax
+    return inss(gross_salary, _INSS_BRACKETS, INSS_CEILING)
 
 def calculate_irrf(base_salary):
     """
     Calcula o IRRF sobre uma base de cálculo (Bruto - INSS).
     Usa o desconto simplificado de R$ 564,80.
     """
-    # Aplicar o desconto simplificado
-    taxable_base = base_salary - IRRF_SIMPLIFIED_DEDUCTION
-    
-    if taxable_base <= 2259.20: # Limite de isenção pós-desconto
-         return 0.0
-
-    for limit, rate, deduction in IRRF_TABLE:
-        if taxable_base <= limit:
-            tax = (taxable_base * rate) - deduction
-            return max(0, tax) # Imposto não pode ser negativo
-    return 0.0 # Fallback
+    return irrf(base_salary, IRRF_TABLE, IRRF_SIMPLIFIED_DEDUCTION)
 
 # ===================================================================
-# LÓGICA DE CÁLCULO (CLT ATUALIZADA)
+# VERSÕES VETORIZADAS (NumPy) - calculam vários salários de uma vez
 # ===================================================================
 
-def calculate_clt_equivalent_monthly_value(gross_salary, extra_benefits=0):
+def _inss_batch(gross_salary):
+    """INSS progressivo para um array de salários (mesma regra de calculate_inss_clt)."""
+    gross_salary = np.asarray(gross_salary, dtype=np.float64)
+    # Faixa de cada salário por busca binária; acima do último teto vale o INSS_CEILING
+    i = np.minimum(np.searchsorted(_INSS_CEILS, gross_salary), len(_INSS_CEILS) - 1)
+    tax = _INSS_PRIOR_TAX[i] + (gross_salary - _INSS_FLOORS[i]) * _INSS_RATES[i]
+    return np.where(gross_salary > 7786.02, INSS_CEILING, tax)
+
+def _irrf_batch(base_salary):
+    """IRRF para um array de bases de cálculo (mesma regra de calculate_irrf)."""
+    taxable_base = np.asarray(base_salary, dtype=np.float64) - IRRF_SIMPLIFIED_DEDUCTION
+    # searchsorted (lado esquerdo) = primeira faixa com taxable_base <= limite
+    i = np.searchsorted(_IRRF_LIMITS, taxable_base)
+    tax = (taxable_base * _IRRF_RATES[i]) - _IRRF_DEDUCTIONS[i]
+    return np.where(taxable_base <= _IRRF_LIMITS[0], 0.0, np.maximum(0, tax)) # Faixa isenta
+
+def _clt_batch(gross_salary, extra_benefits=0):
     """
-    Calcula o VALOR LÍQUIDO EQUIVALENTE do CLT.
-    (Bruto - Descontos) + Benefícios (Líquidos/12) + FGTS.
+    Versão vetorizada de calculate_clt_equivalent_monthly_value.
+    Retorna uma tupla de arrays na ordem: bruto, benefícios, INSS, IRRF,
+    líquido, 13º, férias, FGTS e valor equivalente.
     """
-    
+    gross_salary = np.asarray(gross_salary, dtype=np.float64)
+    # Benefício escalar vale para todos: a tupla de saída tem arrays do mesmo tamanho
+    extra_benefits = np.broadcast_to(np.asarray(extra_benefits, dtype=np.float64), gross_salary.shape)
+
     # 1. Calcular Descontos do Salário Mensal
-    inss_discount = calculate_inss_clt(gross_salary)
-    base_for_irrf = gross_salary - inss_discount
-    irrf_discount = calculate_irrf(base_for_irrf)
-    
+    inss_discount = _inss_batch(gross_salary)
+    irrf_discount = _irrf_batch(gross_salary - inss_discount)
     net_salary = gross_salary - inss_discount - irrf_discount
-    
+
     # 2. Calcular Benefícios Mensalizados
     # FGTS é sempre sobre o bruto e não tem desconto
     fgts_monthly = gross_salary * 0.08
-    
+
     # 13º (Líquido)
     # Nota: O cálculo real do 13º tem descontos próprios, mas usar o
     # salário líquido como base é uma aproximação 99% correta.
     net_thirteenth_monthly = net_salary / 12
-    
+
     # Férias + 1/3 (Líquido)
     gross_vacation = gross_salary * (1 + 1/3)
     # INSS e IRRF também incidem sobre as férias
-    inss_vacation = calculate_inss_clt(gross_vacation)
-    irrf_vacation = calculate_irrf(gross_vacation - inss_vacation)
-    net_vacation = gross_vacation - inss_vacation - irrf_vacation
-    net_vacation_monthly = net_vacation / 12
-    
+    inss_vacation = _inss_batch(gross_vacation)
+    irrf_vacation = _irrf_batch(gross_vacation - inss_vacation)
+    net_vacation_monthly = (gross_vacation - inss_vacation - irrf_vacation) / 12
+
     # 3. Valor Total Equivalente (Dinheiro no bolso + Patrimônio)
     equivalent_value = net_salary + net_thirteenth_monthly + net_vacation_monthly + fgts_monthly + extra_benefits
-    
+
+    return (gross_salary, extra_benefits, inss_discount, irrf_discount, net_salary,
+            net_thirteenth_monthly, net_vacation_monthly, fgts_monthly, equivalent_value)
+
+def _pj_batch(gross_revenue, costs=0, tax_rate_override=None):
+    """
+    Versão vetorizada de calculate_pj_net_value (inclusive a escolha pelo Fator R).
+    Retorna uma tupla de arrays na ordem: cenário (PJ_SCENARIO_*), alíquota,
+    DAS, INSS do pró-labore, IRRF do pró-labore, líquido antes das provisões,
+    13º, férias, total de provisões e líquido final.
+    """
+    gross_revenue = np.asarray(gross_revenue, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.float64)
+    is_mei = gross_revenue <= MEI_MONTHLY_REVENUE_LIMIT
+
+    if tax_rate_override is not None:
+        scenario = np.where(is_mei, PJ_SCENARIO_MEI, PJ_SCENARIO_MANUAL)
+        tax_rate = np.full_like(gross_revenue, tax_rate_override)
+        das = gross_revenue * tax_rate_override
+        inss_pl = np.full_like(gross_revenue, _INSS_MIN_PRO_LABORE)
+        irrf_pl = np.zeros_like(gross_revenue)
+    else:
+        # Cenário A: Anexo V (pró-labore mínimo)
+        inss_A = _INSS_MIN_PRO_LABORE
+        das_A = gross_revenue * ANEXO_V_RATE
+        net_A = gross_revenue - costs - (das_A + inss_A + 0)
+        # Cenário B: Anexo III (Fator R >= 28%)
+        pl_B = gross_revenue * 0.28
+        inss_B = pl_B * 0.11
+        irrf_B = _irrf_batch(pl_B - inss_B)
+        das_B = gross_revenue * ANEXO_III_RATE
+        net_B = gross_revenue - costs - (das_B + inss_B + irrf_B)
+
+        use_B = net_B > net_A
+        scenario = np.where(is_mei, PJ_SCENARIO_MEI,
+                            np.where(use_B, PJ_SCENARIO_ANEXO_III, PJ_SCENARIO_ANEXO_V))
+        tax_rate = np.where(use_B, ANEXO_III_RATE, ANEXO_V_RATE)
+        das = np.where(use_B, das_B, das_A)
+        inss_pl = np.where(use_B, inss_B, inss_A)
+        irrf_pl = np.where(use_B, irrf_B, 0.0)
+
+    # MEI: DAS fixo e sem pró-labore
+    tax_rate = np.where(is_mei, 0.0, tax_rate)
+    das = np.where(is_mei, DAS_MEI_FIXED_VALUE, das)
+    inss_pl = np.where(is_mei, 0.0, inss_pl)
+    irrf_pl = np.where(is_mei, 0.0, irrf_pl)
+    total_costs = np.where(is_mei, costs + das, costs + das + inss_pl + irrf_pl)
+    net_value_pre_provision = gross_revenue - total_costs
+
+    thirteenth_provision = net_value_pre_provision / 12
+    vacation_provision = thirteenth_provision.copy() # Mesmo valor (1 mês), array próprio
+    total_provisions = thirteenth_provision + vacation_provision
+    net_value_with_provisioning = net_value_pre_provision - total_provisions
+
+    return (scenario, tax_rate, das, inss_pl, irrf_pl, net_value_pre_provision,
+            thirteenth_provision, vacation_provision, total_provisions, net_value_with_provisioning)
+
+# ===================================================================
+# LÓGICA DE CÁLCULO (CLT ATUALIZADA)
+# ===================================================================
+
+def calculate_clt_equivalent_monthly_value(gross_salary, extra_benefits=0):
+    """
+    Calcula o VALOR LÍQUIDO EQUIVALENTE do CLT.
+    (Bruto - Descontos) + Benefícios (Líquidos/12) + FGTS.
+    """
+    (inss_discount, irrf_discount, net_salary, net_thirteenth_monthly,
+     net_vacation_monthly, fgts_monthly, equivalent_value) = clt_equivalent(
+        gross_salary, extra_benefits, _INSS_BRACKETS, INSS_CEILING, IRRF_TABLE, IRRF_SIMPLIFIED_DEDUCTION)
+
     return {
         'grossSalary': gross_salary,
         'extraBenefits': extra_benefits,
@@ -161,92 +264,39 @@ def calculate_clt_equivalent_monthly_value(gross_salary, extra_benefits=0):
 # ===================================================================
 # LÓGICA DE CÁLCULO (PJ ATUALIZADA - FATOR R)
 # ===================================================================
+# Parâmetros do Simples/MEI na ordem esperada por _tax_kernels.pj_net
+_PJ_PARAMS = (MEI_MONTHLY_REVENUE_LIMIT, DAS_MEI_FIXED_VALUE, _INSS_MIN_PRO_LABORE, ANEXO_III_RATE, ANEXO_V_RATE)
+
+# Rótulos de cada cenário do kernel PJ (o de taxa manual é montado com a alíquota)
+_PJ_REGIMES = {
+    PJ_SCENARIO_MEI: ('MEI', 'MEI (Regime Simplificado)'),
+    PJ_SCENARIO_ANEXO_V: ('Simples Nacional', 'Anexo V (Pró-labore Mínimo)'),
+    PJ_SCENARIO_ANEXO_III: ('Simples Nacional', 'Anexo III (Fator R)'),
+    PJ_SCENARIO_MANUAL: ('Simples Nacional', None),
+}
+
 def calculate_pj_net_value(gross_revenue, costs=0, tax_rate_override=None):
     """
     Calcula o valor líquido PJ com OTIMIZAÇÃO TRIBUTÁRIA (Fator R).
     Compara Anexo V vs. Anexo III e escolhe o mais barato.
     """
-    
-    # 1. Cenário MEI (Simples e direto)
-    if gross_revenue <= MEI_MONTHLY_REVENUE_LIMIT:
-        regime = 'MEI'
-        strategy = 'MEI (Regime Simplificado)'
-        tax_amount_das = DAS_MEI_FIXED_VALUE
-        pro_labore = 0
-        inss_pro_labore = 0
-        irrf_pro_labore = 0
-        total_costs = costs + tax_amount_das
-        net_value_pre_provision = gross_revenue - total_costs
-    
-    # 2. Cenário Simples Nacional (A Mágica do Fator R)
-    else:
-        regime = 'Simples Nacional'
-        
-        # Se usuário forçou a taxa, usamos a lógica antiga (sem otimização)
-        if tax_rate_override is not None:
-            strategy = f'Taxa Manual ({tax_rate_override*100:.1f}%)'
-            tax_rate = tax_rate_override
-            tax_amount_das = gross_revenue * tax_rate
-            # Assume pró-labore mínimo para quem força a taxa
-            pro_labore = MINIMUM_WAGE
-            inss_pro_labore = pro_labore * 0.11
-            irrf_pro_labore = 0 # IRRF é isento no salário mínimo
-            
-        else:
-            # --- Otimização: Calcular os DOIS cenários ---
-            
-            # Cenário A: ANEXO V (Pró-labore Mínimo)
-            pl_A = MINIMUM_WAGE
-            inss_A = pl_A * 0.11
-            irrf_A = 0 # Isento
-            das_A = gross_revenue * ANEXO_V_RATE
-            total_cost_A = das_A + inss_A + irrf_A
-            net_A = gross_revenue - costs - total_cost_A
-            
-            # Cenário B: ANEXO III (Fator R >= 28%)
-            pl_B = gross_revenue * 0.28
-            inss_B = pl_B * 0.11
-            irrf_B_base = pl_B - inss_B
-            irrf_B = calculate_irrf(irrf_B_base) # IRRF sobre pró-labore alto
-            das_B = gross_revenue * ANEXO_III_RATE
-            total_cost_B = das_B + inss_B + irrf_B
-            net_B = gross_revenue - costs - total_cost_B
-            
-            # --- Decisão do "Contador Digital" ---
-            if net_B > net_A:
-                # Vale a pena pagar mais INSS/IRRF para economizar no DAS
-                strategy = 'Anexo III (Fator R)'
-                tax_rate = ANEXO_III_RATE
-                tax_amount_das = das_B
-                pro_labore = pl_B
-                inss_pro_labore = inss_B
-                irrf_pro_labore = irrf_B
-            else:
-                # Mais barato ficar no Anexo V
-                strategy = 'Anexo V (Pró-labore Mínimo)'
-                tax_rate = ANEXO_V_RATE
-                tax_amount_das = das_A
-                pro_labore = pl_A
-                inss_pro_labore = inss_A
-                irrf_pro_labore = irrf_A
-        
-        total_costs = costs + tax_amount_das + inss_pro_labore + irrf_pro_labore
-        net_value_pre_provision = gross_revenue - total_costs
-
-    # 3. Calcular Provisões (Férias/13º)
-    # A provisão é sobre o LÍQUIDO que sobra, não sobre o bruto.
-    thirteenth_provision = net_value_pre_provision / 12
-    vacation_provision = net_value_pre_provision / 12 # Simplificado (1 mês)
-    total_provisions = thirteenth_provision + vacation_provision
-    
-    net_value_with_provisioning = net_value_pre_provision - total_provisions
+    has_override = tax_rate_override is not None
+    (scenario, tax_rate, tax_amount_das, inss_pro_labore, irrf_pro_labore,
+     net_value_pre_provision, thirteenth_provision, vacation_provision,
+     total_provisions, net_value_with_provisioning) = pj_net(
+        gross_revenue, costs, has_override, tax_rate_override if has_override else 0.0,
+        _PJ_PARAMS, IRRF_TABLE, IRRF_SIMPLIFIED_DEDUCTION)
+
+    regime, strategy = _PJ_REGIMES[scenario]
+    if strategy is None:
+        strategy = f'Taxa Manual ({tax_rate_override*100:.1f}%)'
     
     return {
         'regime': regime,
         'strategy': strategy,                   # NOVO
         'grossRevenue': gross_revenue,
         'costs': costs,
-        'taxRate': locals().get('tax_rate', 0), # Taxa efetiva usada
+        'taxRate': tax_rate,                    # Taxa efetiva usada
         'taxAmount': tax_amount_das,            # Renomeado de taxAmount
         'proLaboreInss': inss_pro_labore,       # Renomeado de proLaboreInss
         'proLaboreIrrf': irrf_pro_labore,       # NOVO
@@ -258,116 +308,108 @@ def calculate_pj_net_value(gross_revenue, costs=0, tax_rate_override=None):
     }
 
 # ===================================================================
-# LÓGICA DE DADOS (Sem mudanças)
+# LÓGICA DE DADOS (base de mercado em core/data.py)
 # ===================================================================
 def get_market_rate_from_csv(area, seniority, location):
-    """Busca a taxa mais recente (último mês) para os cálculos principais."""
-    if df_market.empty: return None
-    try:
-        # Filtra pelo cargo
-        df_filtered = df_market[
-            (df_market['area'] == area) &
-            (df_market['seniority'] == seniority) &
-            (df_market['location'] == location)
-        ]
-        
-        if df_filtered.empty: return None
-        
-        # Ordena por data e pega o último registro (Mês 12/Atual)
-        latest_data = df_filtered.sort_values('data_ref').iloc[-1]
-        
-        return {
-            'clt': float(latest_data['clt_avg']), 
-            'pj': float(latest_data['pj_avg'])
-        }
-    except Exception as e:
-        print(f"Erro ao consultar DataFrame: {e}")
-        return None
+    """Busca a taxa mais recente (último mês) para os cálculos principais (MarketRate ou None)."""
+    return load_market().index.get((area, seniority, location))
 
+# Poucas combinações possíveis (áreas x senioridades x locais x modo), então o
+# cache cobre praticamente todas. O retorno é todo em tuplas, para ninguém
+# alterar o valor compartilhado entre requisições.
+@lru_cache(maxsize=512)
 def get_historical_data_from_csv(area, seniority, location, work_mode):
     """Retorna datas, valores e a data do próximo mês para previsão."""
-    if df_market.empty: return None, None, None
-    
-    try:
-        df_filtered = df_market[
-            (df_market['area'] == area) &
-            (df_market['seniority'] == seniority) &
-            (df_market['location'] == location)
-        ].sort_values('data_ref').tail(12)
-        
-        if df_filtered.empty: return None, None, None
-
-        # Formata datas (Eixo X)
-        labels = df_filtered['data_ref'].dt.strftime('%b/%y').tolist()
-        
-        # Pega valores
-        col_name = 'clt_avg' if work_mode == 'clt' else 'pj_avg'
-        values = df_filtered[col_name].tolist()
-        
-        # Calcula o rótulo do próximo mês (para a previsão)
-        last_date = df_filtered['data_ref'].iloc[-1]
-        next_date = last_date + relativedelta(months=1)
-        next_label = next_date.strftime('%b/%y')
-        
-        return labels, values, next_label
-        
-    except Exception as e:
-        print(f"Erro ao buscar histórico: {e}")
-        return None, None, None
+    series = load_market().history.get((area, seniority, location))
+    if series is None: return None, None, None
+
+    # Últimos 12 meses: fatias das colunas, sem copiar a série inteira
+    # (Eixo X: rótulos já formatados na carga da base)
+    labels = series.labels[-12:]
+
+    # Pega valores (tolist devolve floats nativos, serializáveis em JSON)
+    column = series.clt if work_mode == 'clt' else series.pj
+    values = tuple(column[-12:].tolist())
+
+    # Calcula o rótulo do próximo mês (para a previsão)
+    # (as datas são datetime64[M], então "+ 1" já é o mês seguinte)
+    next_date = (series.dates[-1] + 1).astype(date)
+    next_label = next_date.strftime('%b/%y')
+
+    return labels, values, next_label
 
 # ===================================================================
-# "IA SIMULADA" (Sem mudanças, já compara os valores finais)
+# "IA SIMULADA" (análise em texto, compara os valores finais)
 # ===================================================================
 
-def get_financial_analysis(clt, pj, work_mode, area, seniority, market_rate):
-    def f(val): return format_currency(val)
+# Frases da análise como templates prontos; a função só escolhe a chave e formata.
+# Posição do salário CLT em relação à média de mercado
+_MERCADO_TEMPLATES = {
+    'aligned': "Seu salário CLT atual está alinhado com a média de mercado para sua função e nível.",
+    'above': ("Seu salário CLT atual, que já está {pct} acima da média, demonstra que você está "
+              "em uma posição muito favorável e valorizada."),
+    'below': ("No entanto, seu salário CLT atual está {pct} abaixo da média de mercado, "
+              "o que indica que você tem uma forte base para negociar."),
+}
+# Variantes para quem já está acima da média e recebe uma proposta PJ muito inferior
+_MERCADO_WEAK_PJ_SUFFIX = " Isso enfraquece a justificativa para aceitar uma proposta PJ tão inferior."
+_MERCADO_TEMPLATES['aligned_pj_loss'] = _MERCADO_TEMPLATES['aligned'] + _MERCADO_WEAK_PJ_SUFFIX
+_MERCADO_TEMPLATES['above_pj_loss'] = (
+    _MERCADO_TEMPLATES['above'].replace("demonstra que você está", "demonstra que você já está")
+    + _MERCADO_WEAK_PJ_SUFFIX
+)
+
+# Resultado da troca, por modo de trabalho atual ('clt' ou 'pj') e ganho/perda/empate
+_TROCA_TEMPLATES = {
+    'clt': {
+        'win': ("A proposta PJ, mesmo provisionando benefícios, representa um ganho mensal de {diff}. "
+                "Financeiramente, a troca é vantajosa."),
+        'loss': ("A proposta PJ representa uma perda financeira substancial de {diff} "
+                 "em comparação ao seu valor CLT atual, tornando a troca financeiramente desvantajosa."),
+        'tie': ("A proposta PJ é financeiramente equivalente ao seu valor CLT atual, com uma diferença de apenas {diff}. "
+                "A decisão deve se basear em outros fatores, como flexibilidade vs. segurança."),
+    },
+    'pj': {
+        'win': ("A proposta CLT oferece um valor total {diff} maior que seu líquido PJ atual (com provisão). "
+                "Financeiramente, a troca é positiva."),
+        'loss': ("Alerta: A proposta CLT tem um valor total {diff} menor que seu líquido PJ atual (com provisão). "
+                 "Na prática, você estaria aceitando uma redução para ter a segurança da CLT."),
+        'tie': ("A proposta CLT ({clt}) é financeiramente equivalente "
+                "ao seu líquido real PJ atual ({pj}). "
+                "A decisão de trocar a flexibilidade pela segurança depende de você."),
+    },
+}
+
+def get_financial_analysis(clt, pj, work_mode, area, seniority, market_rate, clt_final_f, pj_final_f, diff_f):
+    """
+    Texto da análise. Os valores monetários chegam já formatados pela view
+    (clt_final_f, pj_final_f e diff_f = |PJ - CLT|), que também os exibe.
+    """
     clt_final = clt['equivalentValue']
     pj_final = pj['netValueWithProvisioning']
+
+    # Modo atual 'clt' compara a proposta PJ contra o CLT; qualquer outro, o inverso
+    mode = 'clt' if work_mode == 'clt' else 'pj'
+    diferenca_troca = pj_final - clt_final if mode == 'clt' else clt_final - pj_final
+    troca_key = 'win' if diferenca_troca > 200 else 'loss' if diferenca_troca < -200 else 'tie'
+    frase_troca = _TROCA_TEMPLATES[mode][troca_key].format(diff=diff_f, clt=clt_final_f, pj=pj_final_f)
+
     frase_mercado = ""
-    is_above_mercado = False
-    
-    if market_rate and market_rate.get('clt') and clt['grossSalary'] > 0:
-        market_value = market_rate['clt']
-        salary_value = clt['grossSalary']
-        diferenca_mercado = salary_value - market_value
+    if market_rate and market_rate.clt and clt['grossSalary'] > 0:
+        market_value = market_rate.clt
+        diferenca_mercado = clt['grossSalary'] - market_value
         percent_diff_mercado = (diferenca_mercado / market_value) * 100
         is_above_mercado = diferenca_mercado >= 0
-        pct_abs = f"{abs(percent_diff_mercado):.0f}%"
-        posicao = "acima" if is_above_mercado else "abaixo"
-        
+
         if abs(percent_diff_mercado) < 5:
-             frase_mercado = f"Seu salário CLT atual está alinhado com a média de mercado para sua função e nível."
+            mercado_key = 'aligned'
         elif is_above_mercado:
-             frase_mercado = f"Seu salário CLT atual, que já está {pct_abs} {posicao} da média, demonstra que você está em uma posição muito favorável e valorizada."
-        else:
-             frase_mercado = f"No entanto, seu salário CLT atual está {pct_abs} {posicao} da média de mercado, o que indica que você tem uma forte base para negociar."
-
-    if work_mode == 'clt':
-        diferenca_troca = pj_final - clt_final
-        if diferenca_troca > 200:
-            frase_troca = (f"A proposta PJ, mesmo provisionando benefícios, representa um ganho mensal de {f(diferenca_troca)}. "
-                           f"Financeiramente, a troca é vantajosa.")
-        elif diferenca_troca < -200:
-            frase_troca = (f"A proposta PJ representa uma perda financeira substancial de {f(abs(diferenca_troca))} "
-                           f"em comparação ao seu valor CLT atual, tornando a troca financeiramente desvantajosa.")
-            if is_above_mercado:
-                frase_mercado = frase_mercado.replace("demonstra que você está", "demonstra que você já está")
-                frase_mercado += " Isso enfraquece a justificativa para aceitar uma proposta PJ tão inferior."
-        else:
-            frase_troca = (f"A proposta PJ é financeiramente equivalente ao seu valor CLT atual, com uma diferença de apenas {f(abs(diferenca_troca))}. "
-                           f"A decisão deve se basear em outros fatores, como flexibilidade vs. segurança.")
-    else: 
-        diferenca_troca = clt_final - pj_final
-        if diferenca_troca > 200:
-            frase_troca = (f"A proposta CLT oferece um valor total {f(diferenca_troca)} maior que seu líquido PJ atual (com provisão). "
-                           f"Financeiramente, a troca é positiva.")
-        elif diferenca_troca < -200:
-             frase_troca = (f"Alerta: A proposta CLT tem um valor total {f(abs(diferenca_troca))} menor que seu líquido PJ atual (com provisão). "
-                            f"Na prática, você estaria aceitando uma redução para ter a segurança da CLT.")
+            mercado_key = 'above'
         else:
-             frase_troca = (f"A proposta CLT ({f(clt_final)}) é financeiramente equivalente "
-                            f"ao seu líquido real PJ atual ({f(pj_final)}). "
-                            f"A decisão de trocar a flexibilidade pela segurança depende de você.")
+            mercado_key = 'below'
+        if is_above_mercado and mode == 'clt' and troca_key == 'loss':
+            mercado_key += '_pj_loss'
+        frase_mercado = _MERCADO_TEMPLATES[mercado_key].format(pct=f"{abs(percent_diff_mercado):.0f}%")
 
     return f"{frase_troca} {frase_mercado}"
 
@@ -378,12 +420,19 @@ def calculate_trend_prediction(prices):
     if not prices or len(prices) < 2:
         return None
 
-    x = np.arange(len(prices))
-    y = np.array(prices)
-    
-    slope, intercept = np.polyfit(x, y, 1)
-    
-    forecast_value = (slope * len(prices)) + intercept
+    # Reta de mínimos quadrados em forma fechada (em vez de np.polyfit, que monta
+    # a matriz de Vandermonde e resolve por SVD). Como x = 0..n-1, as somas de x
+    # e de x² são conhecidas; só as somas que dependem dos preços são calculadas.
+    n = len(prices)
+    sum_x = n * (n - 1) / 2
+    sum_x2 = (n - 1) * n * (2 * n - 1) / 6
+    sum_y = sum(prices)
+    sum_xy = sum(i * price for i, price in enumerate(prices))
+
+    slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
+    intercept = (sum_y - slope * sum_x) / n
+
+    forecast_value = (slope * n) + intercept
     
     # NOVAS REGRAS PARA A TENDÊNCIA
     if slope > 75: # Aumentei o limiar para "Forte"
@@ -424,25 +473,35 @@ def calculate_trend_prediction(prices):
         'color_class': color
     }
 
+# Formato curto em PT-BR (índice = número do mês)
+_MONTHS_PT = ('', 'Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez')
+
 def get_last_12_months_labels():
-    labels = []
+    """Rótulos dos últimos 12 meses (do mais antigo ao atual), ex.: 'Mar/25'."""
     today = datetime.now()
-    curr = today
-    for _ in range(12):
-        # Formato curto em PT-BR
-        months_pt = ['', 'Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-        label = f"{months_pt[curr.month]}/{str(curr.year)[2:]}"
-        labels.append(label)
-        
-        # Subtrair um mês (lógica manual para evitar libs extras)
-        month = curr.month - 1
-        year = curr.year
-        if month == 0:
-            month = 12
-            year -= 1
-        curr = curr.replace(year=year, month=month, day=1)
-        
-    return list(reversed(labels))
+    # Meses contados a partir do ano 0 (ano * 12 + mês - 1): voltar i meses é só subtrair
+    current = today.year * 12 + today.month - 1
+    labels = []
+    for months_ago in range(11, -1, -1):
+        year, month_index = divmod(current - months_ago, 12)
+        labels.append(f"{_MONTHS_PT[month_index + 1]}/{str(year)[2:]}")
+    return labels
+
+# Curva normal padrão pré-calculada: de -4 a +4 desvios padrão, 100 pontos para
+# a curva ficar bem lisa. Como a PDF normalizada (0 a 100) não depende da média
+# nem do desvio, o eixo Y sai pronto em JSON.
+_SQRT_2 = math.sqrt(2)
+_GAUSS_Z_AXIS = np.linspace(-4, 4, 100)
+_GAUSS_Y_AXIS = np.exp(-0.5 * _GAUSS_Z_AXIS ** 2)
+_GAUSS_Y_JSON = _to_json((_GAUSS_Y_AXIS / np.max(_GAUSS_Y_AXIS)) * 100)
+
+# O eixo X (o JSON de 100 pontos, a parte cara) só depende da média e do desvio,
+# que é 18% da média. As médias são poucas (uma por cargo na base), então o
+# cache por média acerta quase sempre, mesmo com salários diferentes.
+@lru_cache(maxsize=1024)
+def _gaussian_chart_x(market_mean, std_dev):
+    """Eixo X da curva (-4 a +4 desvios padrão) já serializado em JSON."""
+    return _to_json(market_mean + std_dev * _GAUSS_Z_AXIS)
 
 def calculate_gaussian_distribution(user_value, market_mean):
     """
@@ -462,21 +521,10 @@ def calculate_gaussian_distribution(user_value, market_mean):
     z_score = (user_value - market_mean) / std_dev
 
     # 3. Cálculo do Percentil
-    percentile = 0.5 * (1 + math.erf(z_score / math.sqrt(2))) * 100
+    percentile = 0.5 * (1 + math.erf(z_score / _SQRT_2)) * 100
 
     # 4. Gerar dados para o Gráfico (Bell Curve Perfeita)
-    # Criamos uma faixa de -4 a +4 desvios padrão
-    x_min = market_mean - (4 * std_dev)
-    x_max = market_mean + (4 * std_dev)
-    
-    # Gerar 100 pontos para a curva ficar bem lisa
-    x_axis = np.linspace(x_min, x_max, 100)
-    
-    # Função de Densidade de Probabilidade (PDF)
-    y_axis = (1 / (std_dev * np.sqrt(2 * np.pi))) * np.exp(-0.5 * ((x_axis - market_mean) / std_dev) ** 2)
-
-    # Normalizar Y (0 a 100) para o gráfico
-    y_axis_norm = (y_axis / np.max(y_axis)) * 100
+    # A curva normalizada (Y) é sempre a mesma; só o eixo X muda com média e desvio
 
     # Formatação para o template
     return {
@@ -484,8 +532,8 @@ def calculate_gaussian_distribution(user_value, market_mean):
         'std_dev': std_dev,
         'z_score': z_score,
         'percentile': percentile,
-        'chart_x': json.dumps(x_axis.tolist()),
-        'chart_y': json.dumps(y_axis_norm.tolist()),
+        'chart_x': _gaussian_chart_x(market_mean, std_dev),
+        'chart_y': _GAUSS_Y_JSON,
         'user_x': user_value,
         'is_outlier': abs(z_score) > 1.96, # 95% de confiança
         'z_score_fmt': f"{z_score:+.2f}σ",
@@ -496,189 +544,273 @@ def calculate_gaussian_distribution(user_value, market_mean):
 # A VIEW PRINCIPAL (ATUALIZADA PARA NOVOS DADOS)
 # ===================================================================
 
-def home(request):
-    context = {
+def _to_float(value):
+    """
+    Converte um campo numérico do formulário em float.
+    Sem vírgula vale o padrão do input type="number", com ponto decimal
+    ("1234.56"; "5.000" é 5.0). Com vírgula, o formato brasileiro ("1.234,56");
+    vazio ou inválido vira 0.0 (e cai na validação).
+    """
+    if not value:
+        return 0.0
+    if ',' in value:
+        # Ponto depois da última vírgula é formato americano ("5,000.00"): em vez
+        # de virar 5.0, o valor é tratado como inválido (e cai na validação)
+        if '.' in value[value.rindex(',') + 1:]:
+            return 0.0
+        value = value.replace('.', '').replace(',', '.')
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+# Chaves formatadas do template -> campo de origem nos resultados CLT e PJ
+_CLT_FIELDS = (
+    ('clt_equivalent_formatted', 'equivalentValue'),
+    ('fgts_formatted', 'fgtsMonthly'),
+    ('clt_gross_f', 'grossSalary'),
+    ('clt_inss_f', 'inssDiscount'),
+    ('clt_irrf_f', 'irrfDiscount'),
+    ('clt_net_f', 'netSalary'),
+    ('clt_benefits_f', 'extraBenefits'),
+    ('clt_thirteenth_f', 'thirteenthMonthly'),
+    ('clt_vacation_f', 'vacationMonthly'),
+    ('clt_fgts_f', 'fgtsMonthly'),
+    ('clt_total_f', 'equivalentValue'),
+)
+_PJ_FIELDS = (
+    ('pj_real_formatted', 'netValueWithProvisioning'),
+    ('pj_revenue_f', 'grossRevenue'),
+    ('pj_costs_f', 'costs'),
+    ('pj_tax_f', 'taxAmount'),
+    ('pj_pro_labore_inss_f', 'proLaboreInss'),
+    ('pj_pro_labore_irrf_f', 'proLaboreIrrf'),
+    ('pj_net_pre_provision_f', 'netValue'),
+    ('pj_provisions_f', 'totalProvisions'),
+    ('pj_total_f', 'netValueWithProvisioning'),
+)
+# Campos de origem sem repetição: cada valor é formatado uma única vez por requisição
+_CLT_SOURCE_FIELDS = tuple(dict.fromkeys(field for _, field in _CLT_FIELDS))
+_PJ_SOURCE_FIELDS = tuple(dict.fromkeys(field for _, field in _PJ_FIELDS))
+
+# Contexto padrão da página (GET), montado uma vez (na primeira requisição, junto
+# com a base de mercado). Cada requisição recebe uma cópia rasa, já que o render
+# do Django exige um dict e o POST altera as chaves.
+@lru_cache(maxsize=None)
+def _default_context():
+    market = load_market()
+    return MappingProxyType({
         'result': None,
         'clt_bruto': None,
         'pj_bruto': None,
         'beneficios_extras': None,
         'pj_costs': None,
         'work_mode': 'clt',
-        'areas_list': AREAS_LIST,
-        'seniorities_list': SENIORITIES_LIST,
-        'locations_list': LOCATIONS_LIST,
+        'areas_list': market.areas,
+        'seniorities_list': market.seniorities,
+        'locations_list': market.locations,
         'selected_area': '',
         'selected_seniority': '',
         'selected_location': '',
         'mei_limit': MEI_MONTHLY_REVENUE_LIMIT,
         'pj_tax_rate_override': '',
-    }
+    })
+
+def _error_response(request, context, message):
+    """
+    Resposta para erro de validação: JSON leve (400) para chamadas AJAX
+    (X-Requested-With), sem passar pelo template; senão a página completa,
+    com a mensagem no #form-error.
+    """
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'error': message}, status=400)
+    context['error'] = message
+    return render(request, 'index.html', context)
 
-    if request.method == 'POST':
-        try:
-            area = request.POST.get('area', '')
-            seniority = request.POST.get('seniority', '')
-            location = request.POST.get('location', '')
-            clt_bruto_str = request.POST.get('clt_bruto', '0')
-            pj_bruto_str = request.POST.get('pj_bruto', '0')
-            beneficios_extras_str = request.POST.get('beneficios_extras', '0')
-            pj_costs_str = request.POST.get('pj_costs', '0')
-            work_mode = request.POST.get('work_mode', 'clt')
-            
-            pj_tax_rate_override_str = request.POST.get('pj_tax_rate_override', '')
-            pj_tax_rate_override_num = float(pj_tax_rate_override_str) / 100 if pj_tax_rate_override_str else None
-
-            clt_bruto = float(clt_bruto_str) if clt_bruto_str else 0
-            pj_bruto = float(pj_bruto_str) if pj_bruto_str else 0
-            beneficios_extras = float(beneficios_extras_str) if beneficios_extras_str else 0
-            pj_costs = float(pj_costs_str) if pj_costs_str else 0
-
-            # Validações (sem mudança)
-            if not area or not seniority or not location:
-                context['error'] = 'Por favor, preencha seu contexto profissional para uma análise completa.'
-                return render(request, 'index.html', context)
-            if clt_bruto <= 0 or pj_bruto <= 0:
-                context['error'] = 'Por favor, insira valores válidos e positivos para salário e faturamento.'
-                context['selected_area'] = area
-                context['selected_seniority'] = seniority
-                context['selected_location'] = location
-                return render(request, 'index.html', context)
-
-            # --- NOVOS CÁLCULOS ---
-            clt_result = calculate_clt_equivalent_monthly_value(clt_bruto, beneficios_extras)
-            pj_result = calculate_pj_net_value(pj_bruto, pj_costs, pj_tax_rate_override_num)
-            
-            market_rate = get_market_rate_from_csv(area, seniority, location)
-            
-            # 2. Busca histórico REAL para o gráfico (NOVO)
-            trend_data = None
-            # Agora desempacotamos 3 valores: labels, valores e o label futuro
-            hist_labels, hist_values, next_label = get_historical_data_from_csv(area, seniority, location, work_mode)
-            
-            if hist_labels and hist_values:
-                prediction = calculate_trend_prediction(hist_values)
-                
-                if prediction:
-                    # Converter previsão para float nativo do Python (evita erros com NumPy)
-                    forecast_val = float(prediction['forecast'])
-                    
-                    # Série 1: Histórico (12 meses)
-                    # Série 2: Previsão (Conecta o último ponto histórico ao futuro)
-                    # [None, None, ..., Valor_Dez, Valor_Jan_Prev]
-                    pred_series = [None] * (len(hist_values) - 1) + [hist_values[-1], forecast_val]
-                    
-                    trend_data = {
-                        # JSON Dumps garante que [None] vire [null] para o JavaScript
-                        'chart_categories': json.dumps(hist_labels + [next_label]),
-                        'series_historical': json.dumps(hist_values),
-                        'series_prediction': json.dumps(pred_series),
-                        'chart_series_name': json.dumps(f"Histórico {work_mode.upper()} - {area}"),
-                        
-                        # Dados do Card de Insight (Strings normais, não precisa de dumps)
-                        'forecast_value_f': format_currency(forecast_val),
-                        'insight_title': prediction['status'],
-                        'insight_desc': prediction['description'],
-                        'insight_color': prediction['color_class'],
-                        'slope': prediction['slope']
-                    }
-
-            # Gera análise textual
-            analysis_text = get_financial_analysis(clt_result, pj_result, work_mode, area, seniority, market_rate)
-            diferenca_final = pj_result['netValueWithProvisioning'] - clt_result['equivalentValue']
-
-            stats_data = None
-            
-            if market_rate and market_rate.get('clt'):
-                # O usuário pediu para focar apenas na comparação CLT vs Mercado CLT
-                # Pois PJ tem muitas variáveis (impostos, benefícios) que distorcem a curva.
-                
-                market_mean_stats = market_rate['clt'] # Sempre compara com a média CLT
-                user_val_stats = clt_bruto # Sempre usa o valor CLT inputado
-                
-                # Define o rótulo correto baseado no contexto
-                if work_mode == 'clt':
-                    user_label = "CLT Atual"
-                else:
-                    user_label = "Proposta CLT"
-                
-                # Chama a função de cálculo
-                stats_data = calculate_gaussian_distribution(user_val_stats, market_mean_stats)
-                
-                if stats_data:
-                    stats_data['user_label'] = user_label
-            
-            # Monta o contexto final
-            result_data = {
-                'clt': clt_result,
-                'pj': pj_result,
-                'analysis': analysis_text,
-                'marketRate': market_rate,
-                'statistics': stats_data,
-                'trend': trend_data,  # <--- Gráfico com dados reais
-                'diferenca': diferenca_final,
-                
-                # ... (Mantenha os format_currency existentes: clt_equivalent_formatted, etc.)
-                'clt_equivalent_formatted': format_currency(clt_result['equivalentValue']),
-                'pj_real_formatted': format_currency(pj_result['netValueWithProvisioning']),
-                'fgts_formatted': format_currency(clt_result['fgtsMonthly']),
-                'diferenca_formatted': format_currency(abs(diferenca_final)),
-                
-                'clt_gross_f': format_currency(clt_result['grossSalary']),
-                'clt_inss_f': format_currency(clt_result['inssDiscount']),
-                'clt_irrf_f': format_currency(clt_result['irrfDiscount']),
-                'clt_net_f': format_currency(clt_result['netSalary']),
-                'clt_benefits_f': format_currency(clt_result['extraBenefits']),
-                'clt_thirteenth_f': format_currency(clt_result['thirteenthMonthly']),
-                'clt_vacation_f': format_currency(clt_result['vacationMonthly']),
-                'clt_fgts_f': format_currency(clt_result['fgtsMonthly']),
-                'clt_total_f': format_currency(clt_result['equivalentValue']),
-                
-                'pj_revenue_f': format_currency(pj_result['grossRevenue']),
-                'pj_costs_f': format_currency(pj_result['costs']),
-                'pj_tax_f': format_currency(pj_result['taxAmount']),
-                'pj_tax_rate_f': f"{pj_result['taxRate'] * 100:.1f}%",
-                'pj_pro_labore_inss_f': format_currency(pj_result['proLaboreInss']),
-                'pj_pro_labore_irrf_f': format_currency(pj_result['proLaboreIrrf']),
-                'pj_net_pre_provision_f': format_currency(pj_result['netValue']),
-                'pj_provisions_f': format_currency(pj_result['totalProvisions']),
-                'pj_total_f': format_currency(pj_result['netValueWithProvisioning']),
+# Mensagem genérica para valores que não puderam ser convertidos ou calculados
+_PROCESSING_ERROR = "Ocorreu um erro ao processar os valores. Tente novamente."
+
+# Campos do formulário já convertidos e validados (saída de _parse_form)
+_FormInput = namedtuple('_FormInput', [
+    'area', 'seniority', 'location', 'work_mode', 'clt_bruto', 'pj_bruto',
+    'beneficios_extras', 'pj_costs', 'pj_tax_rate_override', 'pj_tax_rate_override_str',
+])
+
+def _parse_form(post):
+    """
+    Converte e valida o POST. Levanta ValidationError com a mensagem para o
+    usuário; code='invalid_values' quando o contexto profissional já foi
+    preenchido (a página volta com ele selecionado).
+    """
+    area = post.get('area', '')
+    seniority = post.get('seniority', '')
+    location = post.get('location', '')
+    work_mode = post.get('work_mode', 'clt')
+
+    pj_tax_rate_override_str = post.get('pj_tax_rate_override', '')
+    try:
+        pj_tax_rate_override = float(pj_tax_rate_override_str) / 100 if pj_tax_rate_override_str else None
+    except ValueError as e:
+        raise ValidationError(_PROCESSING_ERROR) from e
+
+    clt_bruto = _to_float(post.get('clt_bruto', ''))
+    pj_bruto = _to_float(post.get('pj_bruto', ''))
+    beneficios_extras = _to_float(post.get('beneficios_extras', ''))
+    pj_costs = _to_float(post.get('pj_costs', ''))
+
+    # Validações
+    if not area or not seniority or not location:
+        raise ValidationError('Por favor, preencha seu contexto profissional para uma análise completa.')
+    if clt_bruto <= 0 or pj_bruto <= 0:
+        raise ValidationError('Por favor, insira valores válidos e positivos para salário e faturamento.',
+                              code='invalid_values')
+
+    return _FormInput(area, seniority, location, work_mode, clt_bruto, pj_bruto,
+                      beneficios_extras, pj_costs, pj_tax_rate_override, pj_tax_rate_override_str)
+
+def _run_analysis(form):
+    """Cálculos, gráficos e textos do resultado a partir do formulário já validado."""
+    area, seniority, location, work_mode = form.area, form.seniority, form.location, form.work_mode
+    clt_bruto, pj_bruto = form.clt_bruto, form.pj_bruto
+
+    # --- NOVOS CÁLCULOS ---
+    clt_result = calculate_clt_equivalent_monthly_value(clt_bruto, form.beneficios_extras)
+    pj_result = calculate_pj_net_value(pj_bruto, form.pj_costs, form.pj_tax_rate_override)
+
+    market_rate = get_market_rate_from_csv(area, seniority, location)
+
+    # 2. Busca histórico REAL para o gráfico (NOVO)
+    trend_data = None
+    # Agora desempacotamos 3 valores: labels, valores e o label futuro
+    hist_labels, hist_values, next_label = get_historical_data_from_csv(area, seniority, location, work_mode)
+
+    if hist_labels and hist_values:
+        prediction = calculate_trend_prediction(hist_values)
+
+        if prediction:
+            # Converter previsão para float nativo do Python (evita erros com NumPy)
+            forecast_val = float(prediction['forecast'])
+
+            # Série 1: Histórico (12 meses)
+            # Série 2: Previsão (Conecta o último ponto histórico ao futuro)
+            # [None, None, ..., Valor_Dez, Valor_Jan_Prev]
+            pred_series = [None] * (len(hist_values) - 1) + [hist_values[-1], forecast_val]
+
+            trend_data = {
+                # JSON Dumps garante que [None] vire [null] para o JavaScript
+                'chart_categories': _to_json([*hist_labels, next_label]),
+                'series_historical': _to_json(hist_values),
+                'series_prediction': _to_json(pred_series),
+                'chart_series_name': _to_json(f"Histórico {work_mode.upper()} - {area}"),
+
+                # Dados do Card de Insight (Strings normais, não precisa de dumps)
+                'forecast_value_f': format_currency(forecast_val),
+                'insight_title': prediction['status'],
+                'insight_desc': prediction['description'],
+                'insight_color': prediction['color_class'],
+                'slope': prediction['slope']
             }
-            
-            if market_rate:
-                # Lógica do benchmark (sem mudanças)
-                proposal_num = clt_result['grossSalary']
-                market_num = market_rate['clt']
-                percentage_diff = ((proposal_num - market_num) / market_num) * 100
-                is_above = percentage_diff >= 0
-                if proposal_num > market_num:
-                    proposal_width = 95
-                    market_width = (market_num / proposal_num) * 95 if proposal_num > 0 else 0
-                else:
-                    market_width = 95
-                    proposal_width = (proposal_num / market_num) * 95 if market_num > 0 else 0
-                
-                result_data['benchmark'] = {
-                    'proposal_val_f': format_currency(proposal_num),
-                    'market_val_f': format_currency(market_num),
-                    'percentageDiff': f"{percentage_diff:.0f}",
-                    'is_above': is_above,
-                    'proposal_width': f"{proposal_width:.2f}",
-                    'market_width': f"{market_width:.2f}",
-                }
-
-            context['result'] = result_data
-            context['clt_bruto'] = clt_bruto
-            context['pj_bruto'] = pj_bruto
-            context['beneficios_extras'] = beneficios_extras
-            context['pj_costs'] = pj_costs
-            context['work_mode'] = work_mode
-            context['selected_area'] = area
-            context['selected_seniority'] = seniority
-            context['selected_location'] = location
-            context['pj_tax_rate_override'] = pj_tax_rate_override_str 
-
-        except (ValueError, TypeError) as e:
-            print(e)
-            context['error'] = "Ocorreu um erro ao processar os valores. Tente novamente."
-
-    return render(request, 'index.html', context)
\ No newline at end of file
+
+    # Valores monetários do detalhamento, formatados uma vez e reaproveitados na análise
+    clt_formatted = {field: format_currency(clt_result[field]) for field in _CLT_SOURCE_FIELDS}
+    pj_formatted = {field: format_currency(pj_result[field]) for field in _PJ_SOURCE_FIELDS}
+    diferenca_final = pj_result['netValueWithProvisioning'] - clt_result['equivalentValue']
+    diferenca_formatted = format_currency(abs(diferenca_final))
+
+    # Gera análise textual
+    analysis_text = get_financial_analysis(
+        clt_result, pj_result, work_mode, area, seniority, market_rate,
+        clt_formatted['equivalentValue'], pj_formatted['netValueWithProvisioning'], diferenca_formatted)
+
+    stats_data = None
+
+    if market_rate and market_rate.clt:
+        # O usuário pediu para focar apenas na comparação CLT vs Mercado CLT
+        # Pois PJ tem muitas variáveis (impostos, benefícios) que distorcem a curva.
+
+        market_mean_stats = market_rate.clt # Sempre compara com a média CLT
+        user_val_stats = clt_bruto # Sempre usa o valor CLT inputado
+
+        # Define o rótulo correto baseado no contexto
+        if work_mode == 'clt':
+            user_label = "CLT Atual"
+        else:
+            user_label = "Proposta CLT"
+
+        # Chama a função de cálculo
+        stats_data = calculate_gaussian_distribution(user_val_stats, market_mean_stats)
+
+        if stats_data:
+            stats_data['user_label'] = user_label
+
+    # Monta o contexto final
+    result_data = {
+        'clt': clt_result,
+        'pj': pj_result,
+        'analysis': analysis_text,
+        'marketRate': market_rate,
+        'statistics': stats_data,
+        'trend': trend_data,  # <--- Gráfico com dados reais
+        'diferenca': diferenca_final,
+
+        'diferenca_formatted': diferenca_formatted,
+        'pj_tax_rate_f': f"{pj_result['taxRate'] * 100:.1f}%",
+    }
+    # Chaves formatadas do template, a partir dos mapas de campos
+    result_data.update({key: clt_formatted[field] for key, field in _CLT_FIELDS})
+    result_data.update({key: pj_formatted[field] for key, field in _PJ_FIELDS})
+
+    if market_rate:
+        # Lógica do benchmark
+        proposal_num = clt_result['grossSalary']
+        market_num = market_rate.clt
+        percentage_diff = ((proposal_num - market_num) / market_num) * 100
+        is_above = percentage_diff >= 0
+        # A maior barra ocupa 95%; o denominador é sempre > 0, pois clt_bruto
+        # já foi validado como positivo e as médias do CSV são positivas.
+        denom = max(proposal_num, market_num)
+        proposal_width = (proposal_num / denom) * 95
+        market_width = (market_num / denom) * 95
+
+        result_data['benchmark'] = {
+            'proposal_val_f': format_currency(proposal_num),
+            'market_val_f': format_currency(market_num),
+            'percentageDiff': f"{percentage_diff:.0f}",
+            'is_above': is_above,
+            'proposal_width': f"{proposal_width:.2f}",
+            'market_width': f"{market_width:.2f}",
+        }
+
+    return result_data
+
+def home(request):
+    if request.method != 'POST':
+        return render(request, 'index.html', dict(_default_context()))
+
+    context = dict(_default_context())
+    try:
+        form = _parse_form(request.POST)
+    except ValidationError as e:
+        if e.code == 'invalid_values':
+            context['selected_area'] = request.POST.get('area', '')
+            context['selected_seniority'] = request.POST.get('seniority', '')
+            context['selected_location'] = request.POST.get('location', '')
+        return _error_response(request, context, e.message)
+
+    # Guarda só em volta da análise: com o formulário já validado ela não deve
+    # falhar, mas se falhar o usuário vê a mensagem da página e não um erro 500
+    try:
+        context['result'] = _run_analysis(form)
+    except (ValueError, TypeError, ArithmeticError):
+        return _error_response(request, context, _PROCESSING_ERROR)
+    context['clt_bruto'] = form.clt_bruto
+    context['pj_bruto'] = form.pj_bruto
+    context['beneficios_extras'] = form.beneficios_extras
+    context['pj_costs'] = form.pj_costs
+    context['work_mode'] = form.work_mode
+    context['selected_area'] = form.area
+    context['selected_seniority'] = form.seniority
+    context['selected_location'] = form.location
+    context['pj_tax_rate_override'] = form.pj_tax_rate_override_str
+
+    return render(request, 'index.html', context)